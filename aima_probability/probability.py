@@ -3,11 +3,14 @@
 import itertools
 import random
 from collections import defaultdict
-from functools import reduce,singledispatch
-from typing import Dict, List, Union
+from dataclasses import dataclass
+from functools import lru_cache, reduce, singledispatch
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+from numba import njit
 
 from .utils import (
-    element_wise_product,
     first,
     inverse_matrix,
     isclose,
@@ -15,8 +18,6 @@ from .utils import (
     normalize,
     probability,
     product,
-    scalar_vector_product,
-    vector_add,
     vector_to_diagonal,
     weighted_sample_with_replacement,
 )
@@ -45,6 +46,20 @@ class ProbDist:
                 self[v] = p
             self.normalize()
 
+    @classmethod
+    def from_array(cls, varname, domain, arr) -> "ProbDist":
+        """Build a distribution over domain from an array of frequencies,
+        normalizing in one vectorized pass instead of per-value updates.
+        Raises a ZeroDivisionError if the sum of the frequencies is 0."""
+        arr = np.asarray(arr, dtype=np.float64)
+        total = arr.sum()
+        if total == 0:
+            raise ZeroDivisionError("The frequencies sum to 0")
+        dist = cls(varname)
+        dist.values = list(domain)
+        dist.prob = dict(zip(domain, arr / total))
+        return dist
+
     def __getitem__(self, val) -> Number:
         """Given a value, return P(value)."""
         try:
@@ -147,7 +162,9 @@ def enumerate_joint_ask(X, e, P: JointProbDist):
     Q = ProbDist(X)  # probability distribution for X, initially empty
     Y = [v for v in P.variables if v != X and v not in e]  # hidden variables.
     for xi in P.values(X):
-        Q[xi] = enumerate_joint(Y, {**e, X: xi}, P)
+        e[X] = xi  # assign-and-restore instead of copying e per value
+        Q[xi] = enumerate_joint(Y, e, P)
+    e.pop(X, None)
     return Q.normalize()
 
 
@@ -157,12 +174,37 @@ def enumerate_joint(variables, e, P):
     if not variables:
         return P[e]
     Y, rest = variables[0], variables[1:]
-    return sum([enumerate_joint(rest, {**e, Y: y}, P) for y in P.values(Y)])
+    total = 0
+    for y in P.values(Y):
+        e[Y] = y  # assign-and-restore instead of copying e per value
+        total += enumerate_joint(rest, e, P)
+    e.pop(Y, None)  # Y may be unset if its domain is empty
+    return total
 
 
 # ______________________________________________________________________________
 
 
+@dataclass
+class FrozenBayesNet:
+    """Structure-of-arrays snapshot of a BayesNet, built by
+    BayesNet.freeze(). The topology lives in CSR-style (indptr, flat)
+    arrays of variable columns and every CPT is concatenated into one
+    flat array, so inference loops can run over plain ndarrays (and
+    compile under Numba) without touching nodes or dicts."""
+
+    column: Dict[str, int]  # variable name -> column in bn.variables
+    domain_size: np.ndarray  # (V,) domain cardinalities
+    parents_indptr: np.ndarray  # (V + 1,) CSR pointers into parents
+    parents: np.ndarray  # (E,) parent columns, grouped by node
+    children_indptr: np.ndarray  # (V + 1,) CSR pointers into children
+    children: np.ndarray  # (E,) child columns, grouped by node
+    cpt_offset: np.ndarray  # (V + 1,) offsets into cpt_flat
+    cpt_flat: np.ndarray  # all CPTs, each laid out as in _node_flat_cpt
+    p_true_offset: Optional[np.ndarray]  # (V + 1,) offsets into p_true
+    p_true: Optional[np.ndarray]  # packed P(True | parents), bool nets only
+
+
 class BayesNet:
     """Bayesian network containing only boolean-variable nodes."""
 
@@ -170,6 +212,9 @@ class BayesNet:
         """Nodes must be ordered with parents before children."""
         self.nodes = []
         self.variables = []
+        self._var_to_node = {}
+        self._compiled_enumeration = None
+        self._frozen = None
         node_specs = node_specs or []
         for node_spec in node_specs:
             self.add(node_spec)
@@ -185,6 +230,9 @@ class BayesNet:
         assert all((parent in self.variables) for parent in node.parents)
         self.nodes.append(node)
         self.variables.append(node.variable)
+        self._var_to_node[node.variable] = node
+        self._compiled_enumeration = None  # topology changed
+        self._frozen = None
         for parent in node.parents:
             self.variable_node(parent).children.append(node)
 
@@ -192,15 +240,135 @@ class BayesNet:
         """Return the node for the variable named var.
         >>> burglary.variable_node('Burglary').variable
         'Burglary'"""
-        for n in self.nodes:
-            if n.variable == var:
-                return n
-        raise Exception("No such variable: {}".format(var))
+        try:
+            return self._var_to_node[var]
+        except KeyError:
+            raise Exception("No such variable: {}".format(var))
 
     def variable_values(self, var):
         """Return the domain of var."""
         return self.variable_node(var).values()
 
+    def relevant_variables(self, X, e):
+        """Return, in network order, the variables relevant to querying
+        P(X|e): the query and evidence variables and their ancestors.
+        Barren descendants contribute factors that sum to one, so they
+        can be pruned before elimination."""
+        frontier = (X if isinstance(X, list) else [X]) + list(e)
+        relevant = set()
+        while frontier:
+            var = frontier.pop()
+            if var not in relevant:
+                relevant.add(var)
+                frontier.extend(self.variable_node(var).parents)
+        return [var for var in self.variables if var in relevant]
+
+    def min_fill_order(self, variables):
+        """Order variables for elimination by the classic min-fill
+        heuristic on the moralized graph restricted to variables."""
+        allowed = set(variables)
+        neighbors = {var: set() for var in variables}
+        for node in self.nodes:
+            family = [
+                v for v in [node.variable] + node.parents if v in allowed
+            ]
+            for u, v in itertools.combinations(family, 2):
+                neighbors[u].add(v)
+                neighbors[v].add(u)
+
+        def fill_in(var):
+            """Number of edges eliminating var would add."""
+            linked = neighbors[var] & remaining
+            return sum(
+                1
+                for u, v in itertools.combinations(linked, 2)
+                if v not in neighbors[u]
+            )
+
+        order = []
+        remaining = set(variables)
+        while remaining:
+            var = min(sorted(remaining), key=fill_in)
+            linked = neighbors[var] & remaining
+            for u, v in itertools.combinations(linked, 2):
+                neighbors[u].add(v)
+                neighbors[v].add(u)
+            remaining.remove(var)
+            order.append(var)
+        return order
+
+    def compile_enumeration(self):
+        """Generate (and cache) an enumeration_ask specialized to this
+        network: the topology and CPTs are baked into straight-line
+        generated code, so querying does no node, dict or attribute
+        lookups. Returns a callable ask(X, e) -> ProbDist."""
+        if self._compiled_enumeration is None:
+            namespace = {}
+            exec(_joint_source(self), namespace)
+            joint = namespace["joint"]
+            domains = [tuple(self.variable_values(v)) for v in self.variables]
+            column = {var: i for i, var in enumerate(self.variables)}
+
+            def ask(X, e):
+                assert X not in e, (
+                    "Query variable must be distinct from evidence"
+                )
+                choices = [
+                    ((domain.index(e[var]),) if var in e else range(len(domain)))
+                    for var, domain in zip(self.variables, domains)
+                ]
+                x_column = column[X]
+                Q = np.empty(len(domains[x_column]))
+                for xi in range(len(domains[x_column])):
+                    choices[x_column] = (xi,)
+                    Q[xi] = sum(map(joint, itertools.product(*choices)))
+                return ProbDist.from_array(X, domains[x_column], Q)
+
+            self._compiled_enumeration = ask
+        return self._compiled_enumeration
+
+    def freeze(self) -> FrozenBayesNet:
+        """Return (building and caching it on first use) this network as
+        structure-of-arrays storage; see FrozenBayesNet. Invalidated
+        when a node is added."""
+        if self._frozen is None:
+            column = {var: i for i, var in enumerate(self.variables)}
+            parents_indptr, parents = _csr(
+                [[column[p] for p in node.parents] for node in self.nodes]
+            )
+            children_indptr, children = _csr(
+                [
+                    [column[c.variable] for c in node.children]
+                    for node in self.nodes
+                ]
+            )
+            tables = [_node_flat_cpt(node, self) for node in self.nodes]
+            cpt_offset = np.zeros(len(tables) + 1, dtype=np.int64)
+            cpt_offset[1:] = np.cumsum([table.size for table in tables])
+            if all(isinstance(node, BoolBayesNode) for node in self.nodes):
+                packed = [_packed_p_true(node) for node in self.nodes]
+                p_true_offset = np.zeros(len(packed) + 1, dtype=np.int64)
+                p_true_offset[1:] = np.cumsum([t.size for t in packed])
+                p_true = np.concatenate(packed)
+            else:
+                p_true_offset = p_true = None
+            self._frozen = FrozenBayesNet(
+                column=column,
+                domain_size=np.array(
+                    [len(self.variable_values(v)) for v in self.variables],
+                    dtype=np.int64,
+                ),
+                parents_indptr=parents_indptr,
+                parents=parents,
+                children_indptr=children_indptr,
+                children=children,
+                cpt_offset=cpt_offset,
+                cpt_flat=np.concatenate(tables),
+                p_true_offset=p_true_offset,
+                p_true=p_true,
+            )
+        return self._frozen
+
     def __repr__(self):
         return "BayesNet({0!r})".format(self.nodes)
 
@@ -225,13 +393,14 @@ class BayesNode:
         self.cpt = cpt
         self.children = []
         self.domain = sorted(self.determine_domain(cpt))
+        self._flat_cpt = None  # built lazily by _node_flat_cpt
 
     @staticmethod
     def determine_domain(cpt: Dict):
-        cpt_entry_keys = set(first(cpt.values()).keys())
+        # dict keys views compare as sets without allocating one per entry
+        cpt_entry_keys = first(cpt.values()).keys()
         assert all(
-            set(cpt_value.keys()) == cpt_entry_keys
-            for cpt_value in cpt.values()
+            cpt_value.keys() == cpt_entry_keys for cpt_value in cpt.values()
         )
         return cpt_entry_keys
 
@@ -243,7 +412,12 @@ class BayesNode:
         >>> bn = BoolBayesNode('X', 'Burglary', {T: 0.2, F: 0.625})
         >>> bn.p(False, {'Burglary': False, 'Earthquake': True})
         0.375"""
-        return self.cpt[event_values(event, self.parents)][value]
+        return self.p_tuple(value, event_values(event, self.parents))
+
+    def p_tuple(self, value, parent_values):
+        """Like p, but parent_values is already a tuple of the parents'
+        values, skipping the per-call projection of an event dict."""
+        return self.cpt[parent_values][value]
 
     def values(self):
         return self.domain
@@ -268,6 +442,36 @@ class BoolBayesNode(BayesNode):
 
         cpt = self._init_boolean_cpt(cpt, parents)
         super().__init__(X, parents, cpt)
+        # CPT flattened over the parents' boolean values packed into an
+        # int (bit k = parent k); column 0 is False, column 1 is True.
+        self._p_flat = np.array(
+            [
+                [cpt[key][False], cpt[key][True]]
+                for key in (
+                    tuple(bool(i >> k & 1) for k in range(len(parents)))
+                    for i in range(2 ** len(parents))
+                )
+            ]
+        )
+        # float32 copy for the Monte Carlo samplers: their error is
+        # O(1/sqrt(N)), so single precision is plenty and halves the
+        # bandwidth of the packed-table gathers. p() stays float64.
+        self._p_flat32 = self._p_flat.astype(np.float32)
+
+    def p(self, value, event):
+        """Return the conditional probability P(X=value | parents), read
+        from the flat CPT indexed by the parents' packed values in event."""
+        index = 0
+        for k, parent in enumerate(self.parents):
+            index |= bool(event[parent]) << k
+        return float(self._p_flat[index, 1 if value else 0])
+
+    def p_tuple(self, value, parent_values):
+        """Like p, but parent_values is already a tuple of booleans."""
+        index = 0
+        for k, parent_value in enumerate(parent_values):
+            index |= bool(parent_value) << k
+        return float(self._p_flat[index, 1 if value else 0])
 
     @staticmethod
     def _init_boolean_cpt(cpt, parents):
@@ -328,7 +532,9 @@ def enumeration_ask(X, e, bn) -> ProbDist:
     assert X not in e, "Query variable must be distinct from evidence"
     Q = ProbDist(X)
     for xi in bn.variable_values(X):
-        Q[xi] = enumerate_all(bn.variables, {**e, X: xi}, bn)
+        e[X] = xi  # assign-and-restore instead of copying e per value
+        Q[xi] = enumerate_all(bn.variables, e, bn)
+    del e[X]
     return Q.normalize()
 
 
@@ -336,18 +542,93 @@ def enumerate_all(variables, e, bn):
     """Return the sum of those entries in P(variables | e{others})
     consistent with e, where P is the joint distribution represented
     by bn, and e{others} means e restricted to bn's other variables
-    (the ones other than variables). Parents must precede children in variables."""
+    (the ones other than variables). Parents must precede children in variables.
+
+    Instead of recursing (which copies e at every level), enumerate every
+    assignment of the hidden variables as columns of an index array and
+    gather each node's contribution from its flat CPT in one shot."""
     if not variables:
         return 1.0
-    Y, rest = variables[0], variables[1:]
-    Ynode = bn.variable_node(Y)
-    if Y in e:
-        return Ynode.p(e[Y], e) * enumerate_all(rest, e, bn)
-    else:
-        return sum(
-            Ynode.p(y, e) * enumerate_all(rest, {**e, Y: y}, bn)
-            for y in bn.variable_values(Y)
+    hidden = [Y for Y in variables if Y not in e]
+    hidden_col = {Y: i for i, Y in enumerate(hidden)}
+    shape = [len(bn.variable_values(Y)) for Y in hidden]
+    assignments = (
+        np.indices(shape).reshape(len(hidden), -1)
+        if hidden
+        else np.zeros((0, 1), dtype=np.intp)
+    )
+
+    def value_index(V):
+        """Domain index of V's value: a scalar if V is pinned by e, else
+        the column of hidden assignments for V."""
+        if V in e:
+            return bn.variable_values(V).index(e[V])
+        return assignments[hidden_col[V]]
+
+    frozen = bn.freeze()
+    total = np.ones(assignments.shape[1])
+    for Y in variables:
+        node = bn.variable_node(Y)
+        index = 0
+        for parent in node.parents:
+            index = index * len(bn.variable_values(parent)) + value_index(
+                parent
+            )
+        index = index * len(node.domain) + value_index(Y)
+        j = frozen.column[Y]
+        total *= frozen.cpt_flat[frozen.cpt_offset[j] + index]
+    return float(total.sum())
+
+
+def _node_flat_cpt(node, bn):
+    """Return (building it on first use) node's CPT as a flat array laid
+    out in mixed radix over the parents' domain indices followed by the
+    node's own value index, all in bn's domain order."""
+    if node._flat_cpt is None:
+        parent_domains = [bn.variable_values(p) for p in node.parents]
+        node._flat_cpt = np.array(
+            [
+                node.cpt[parent_values][value]
+                for parent_values in itertools.product(*parent_domains)
+                for value in node.domain
+            ]
         )
+    return node._flat_cpt
+
+
+def _joint_source(bn):
+    """Python source specialized to bn: flat CPT tuples plus a
+    straight-line joint(values) over a tuple of domain indices, with the
+    parent columns and radices baked in."""
+    column = {var: i for i, var in enumerate(bn.variables)}
+    lines = []
+    terms = []
+    for i, node in enumerate(bn.nodes):
+        flat = _node_flat_cpt(node, bn)
+        lines.append("_cpt{} = {!r}".format(i, tuple(flat.tolist())))
+        index = ""
+        for parent in node.parents:
+            index = (
+                "values[{}]".format(column[parent])
+                if not index
+                else "({}) * {} + values[{}]".format(
+                    index,
+                    len(bn.variable_values(parent)),
+                    column[parent],
+                )
+            )
+        index = (
+            "values[{}]".format(i)
+            if not index
+            else "({}) * {} + values[{}]".format(index, len(node.domain), i)
+        )
+        terms.append("_cpt{}[{}]".format(i, index))
+    lines.append("")
+    lines.append("def joint(values):")
+    lines.append("    return (")
+    lines.append("        " + "\n        * ".join(terms))
+    lines.append("    )")
+    return "\n".join(lines)
 
 
 # ______________________________________________________________________________
@@ -355,16 +636,22 @@ def enumerate_all(variables, e, bn):
 
 def elimination_ask(X, e, bn) -> ProbDist:
     """Compute bn's P(X|e) by variable elimination. [Figure 14.11]
+    Barren variables are pruned up front; the relevant factors are then
+    contracted in a single np.einsum call, which fuses every pointwise
+    product and sum-out and picks the contraction order itself.
     >>> elimination_ask('Burglary', dict(JohnCalls=T, MaryCalls=T), burglary
     ...  ).show_approx()
     'False: 0.716, True: 0.284'"""
     assert X not in e, "Query variable must be distinct from evidence"
-    factors = []
-    for var in reversed(bn.variables):
-        factors.append(make_factor(var, e, bn))
-        if is_hidden(var, X, e):
-            factors = sum_out(var, factors, bn)
-    return pointwise_product(factors, bn).normalize()
+    relevant = bn.relevant_variables(X, e)
+    axis = {var: i for i, var in enumerate(relevant)}
+    operands = []
+    for var in reversed(relevant):
+        factor = make_factor(var, e, bn)
+        operands.append(factor.values)
+        operands.append([axis[v] for v in factor.variables])
+    values = np.einsum(*operands, [axis[X]], optimize=True)
+    return ProbDist.from_array(X, bn.variable_values(X), values)
 
 
 def is_hidden(var, X, e):
@@ -381,11 +668,14 @@ def make_factor(var, e, bn: BayesNet) -> "Factor":
     is the pointwise product of these factors for bn's variables."""
     node = bn.variable_node(var)
     variables = [X for X in [var] + node.parents if X not in e]
-    cpt = {
-        event_values(e1, variables): node.p(e1[var], e1)
-        for e1 in all_events(variables, bn, e)
-    }
-    return Factor(variables, cpt)
+    domains = [tuple(bn.variable_values(X)) for X in variables]
+    values = np.array(
+        [
+            node.p_tuple(e1[var], tuple(e1[p] for p in node.parents))
+            for e1 in all_events(variables, bn, e)
+        ]
+    ).reshape([len(domain) for domain in domains])
+    return Factor(variables, values, domains)
 
 
 def pointwise_product(factors, bn):
@@ -405,54 +695,116 @@ def sum_out(var, factors, bn):
 
 
 class Factor:
-    """A factor in a joint distribution."""
+    """A factor in a joint distribution, held as a dense array whose
+    axes correspond (in order) to self.variables."""
 
-    def __init__(self, variables, cpt):
+    def __init__(self, variables, cpt, domains=None):
         self.variables = variables
-        self.cpt = cpt
+        if isinstance(cpt, dict):
+            if domains is None:
+                domains = _domains_from_cpt(variables, cpt)
+            index = [
+                {val: i for i, val in enumerate(domain)} for domain in domains
+            ]
+            # NaN-fill so entries missing from cpt poison any result
+            # instead of reading uninitialized memory
+            values = np.full([len(domain) for domain in domains], np.nan)
+            for event, p in cpt.items():
+                values[tuple(ix[val] for ix, val in zip(index, event))] = p
+        else:
+            if domains is None:
+                raise ValueError(
+                    "domains is required when cpt is given as an array"
+                )
+            values = np.asarray(cpt, dtype=np.float64)
+        self.domains = [tuple(domain) for domain in domains]
+        self.values = values
+
+    @property
+    def cpt(self):
+        """My values as a dict keyed by tuples of variable values."""
+        return dict(zip(itertools.product(*self.domains), self.values.flat))
 
     def pointwise_product(self, other, bn) -> "Factor":
-        """Multiply two factors, combining their variables."""
-        variables = list(set(self.variables) | set(other.variables))
-        cpt = {
-            event_values(e, variables): self.p(e) * other.p(e)
-            for e in all_events(variables, bn, {})
-        }
-        return Factor(variables, cpt)
+        """Multiply two factors, combining their variables by broadcasting."""
+        variables = list(self.variables) + [
+            v for v in other.variables if v not in self.variables
+        ]
+        domains = [
+            self.domain_of(v) if v in self.variables else other.domain_of(v)
+            for v in variables
+        ]
+        values = self._aligned(variables) * other._aligned(variables)
+        return Factor(variables, values, domains)
 
     def sum_out(self, var, bn) -> "Factor":
         """Make a factor eliminating var by summing over its values."""
         variables = [X for X in self.variables if X != var]
-        cpt = {
-            event_values(e, variables): sum(
-                self.p({**e, var: val}) for val in bn.variable_values(var)
-            )
-            for e in all_events(variables, bn, {})
-        }
-        return Factor(variables, cpt)
+        domains = [d for X, d in zip(self.variables, self.domains) if X != var]
+        return Factor(
+            variables, self.values.sum(axis=self.variables.index(var)), domains
+        )
 
     def normalize(self) -> ProbDist:
         """Return my probabilities; must be down to one variable."""
         assert len(self.variables) == 1
-        return ProbDist(
-            self.variables[0], {k: v for ((k,), v) in self.cpt.items()}
+        return ProbDist.from_array(
+            self.variables[0], self.domains[0], self.values
         )
 
     def p(self, e):
         """Look up my value tabulated for e."""
-        return self.cpt[event_values(e, self.variables)]
+        values = event_values(e, self.variables)
+        return self.values[
+            tuple(d.index(v) for d, v in zip(self.domains, values))
+        ]
+
+    def domain_of(self, var):
+        """Return the domain along the axis for var."""
+        return self.domains[self.variables.index(var)]
+
+    def _aligned(self, variables) -> np.ndarray:
+        """View of my values transposed and reshaped so that broadcasting
+        lines my axes up with the given variable order."""
+        own = [v for v in variables if v in self.variables]
+        arr = self.values.transpose([self.variables.index(v) for v in own])
+        return arr.reshape(
+            [
+                len(self.domain_of(v)) if v in self.variables else 1
+                for v in variables
+            ]
+        )
+
+
+def _domains_from_cpt(variables, cpt):
+    """Recover each variable's domain (in first-appearance order) from the
+    keys of a tuple-keyed CPT covering the full product of the domains."""
+    domains = [[] for _ in variables]
+    for event in cpt:
+        for domain, val in zip(domains, event):
+            if val not in domain:
+                domain.append(val)
+    return domains
 
 
 def all_events(variables, bn, e):
     """Yield every way of extending e with values for all variables."""
-    possible_values = [bn.variable_values(var) for var in variables]
+    domains = tuple(tuple(bn.variable_values(var)) for var in variables)
 
-    for values in itertools.product(*possible_values):
+    for values in _domain_product(domains):
         result = dict(zip(variables, values))
         result.update(e)
         yield result
 
 
+@lru_cache(maxsize=None)
+def _domain_product(domains):
+    """All value tuples over domains (a tuple of tuples), shared between
+    repeated factor operations over the same shapes instead of rerunning
+    itertools.product each time."""
+    return tuple(itertools.product(*domains))
+
+
 # ______________________________________________________________________________
 
 # [Figure 14.12a]: sprinkler network
@@ -489,19 +841,38 @@ def prior_sample(bn):
 def rejection_sampling(X, e, bn, N=10000):
     """Estimate the probability distribution of variable X given
     evidence e in BayesNet bn, using N samples.  [Figure 14.14]
+    All N samples are drawn at once and rejected with a boolean mask.
     Raises a ZeroDivisionError if all the N samples are rejected,
     i.e., inconsistent with e.
-    >>> random.seed(47)
+    >>> np.random.seed(47)
     >>> rejection_sampling('Burglary', dict(JohnCalls=T, MaryCalls=T),
     ...   burglary, 10000).show_approx()
-    'False: 0.7, True: 0.3'
+    'False: 0.75, True: 0.25'
     """
-    counts = {x: 0 for x in bn.variable_values(X)}  # bold N in [Figure 14.14]
-    for j in range(N):
-        sample = prior_sample(bn)  # boldface x in [Figure 14.14]
-        if consistent_with(sample, e):
-            counts[sample[X]] += 1
-    return ProbDist(X, counts)
+    column = {var: i for i, var in enumerate(bn.variables)}
+    event = _prior_sample_array(bn, N, column)  # boldface x in [Figure 14.14]
+    mask = np.ones(N, dtype=bool)
+    for var, val in e.items():
+        mask &= event[:, column[var]] == bool(val)
+    counts = np.bincount(
+        event[mask, column[X]].astype(int), minlength=2
+    )  # bold N in [Figure 14.14]
+    return ProbDist.from_array(X, [False, True], counts)
+
+
+def _prior_sample_array(bn, N, column):
+    """Sample N events from bn's joint distribution as an (N, num_vars)
+    bool array. All the uniforms are drawn up front in one
+    (num_nodes, N) block, one RNG call for the whole batch; row i feeds
+    node i, so the stream matches per-node draws under the same seed."""
+    frozen = bn.freeze()
+    U = np.random.random((len(bn.nodes), N))
+    event = np.zeros((N, len(bn.variables)), dtype=bool)
+    for i, node in enumerate(bn.nodes):
+        table = _frozen_p_true(frozen, i)
+        pt = table[_packed_parent_index(node, event, column)]
+        event[:, column[node.variable]] = U[i] < pt
+    return event
 
 
 def consistent_with(event, evidence):
@@ -515,18 +886,48 @@ def consistent_with(event, evidence):
 def likelihood_weighting(X, e, bn, N=10000):
     """Estimate the probability distribution of variable X given
     evidence e in BayesNet bn.  [Figure 14.15]
-    >>> random.seed(1017)
+    All N samples are drawn at once, one vectorized pass per node.
+    >>> np.random.seed(1017)
     >>> likelihood_weighting('Burglary', dict(JohnCalls=T, MaryCalls=T),
     ...   burglary, 10000).show_approx()
-    'False: 0.702, True: 0.298'
+    'False: 0.749, True: 0.251'
     """
-    W = {x: 0 for x in bn.variable_values(X)}
-    for j in range(N):
-        sample, weight = weighted_sample(
-            bn, e
-        )  # boldface x, w in [Figure 14.15]
-        W[sample[X]] += weight
-    return ProbDist(X, W)
+    frozen = bn.freeze()
+    column = frozen.column
+    event = np.zeros((N, len(bn.variables)), dtype=bool)
+    w = np.ones(N, dtype=np.float32)  # boldface x, w in [Figure 14.15]
+    for i, node in enumerate(bn.nodes):
+        table = _frozen_p_true(frozen, i)
+        pt = table[_packed_parent_index(node, event, column)]
+        if node.variable in e:
+            event[:, column[node.variable]] = e[node.variable]
+            w *= pt if e[node.variable] else np.float32(1.0) - pt
+        else:
+            event[:, column[node.variable]] = np.random.random(N) < pt
+    W = np.zeros(2)  # float64 accumulator over the float32 weights
+    np.add.at(W, event[:, column[X]].astype(int), w)
+    return ProbDist.from_array(X, [False, True], W)
+
+
+def _packed_p_true(node):
+    """Return node's CPT as a flat float32 array of P(X=True | parents),
+    indexed by the parents' boolean values packed into an int (bit k =
+    parent k)."""
+    return node._p_flat32[:, 1]
+
+
+def _frozen_p_true(frozen, i):
+    """View of node i's packed P(True | parents) table in frozen.p_true."""
+    return frozen.p_true[frozen.p_true_offset[i]:frozen.p_true_offset[i + 1]]
+
+
+def _packed_parent_index(node, event, column):
+    """Pack the parent columns of an (N, num_vars) bool event array into
+    an (N,) int array indexing node's flat CPT."""
+    idx = np.zeros(len(event), dtype=np.intp)
+    for k, parent in enumerate(node.parents):
+        idx |= event[:, column[parent]].astype(np.intp) << k
+    return idx
 
 
 def weighted_sample(bn, e):
@@ -548,18 +949,96 @@ def weighted_sample(bn, e):
 
 
 def gibbs_ask(X, e, bn, N=1000):
-    """[Figure 14.16]"""
+    """[Figure 14.16]
+    The sweep over the nonevidence variables runs in a Numba-compiled
+    loop over an integer state vector and packed CPT tables. Its RNG is
+    seeded from the random module, so runs stay reproducible under
+    random.seed."""
     assert X not in e, "Query variable must be distinct from evidence"
-    counts = {x: 0 for x in bn.variable_values(X)}  # bold N in [Figure 14.16]
+    frozen = bn.freeze()
+    column = frozen.column
+    state = np.zeros(len(bn.variables), dtype=np.int64)
+    for var, val in e.items():  # boldface x in [Figure 14.16]
+        state[column[var]] = int(val)
     Z = [var for var in bn.variables if var not in e]
-    state = dict(e)  # boldface x in [Figure 14.16]
     for Zi in Z:
-        state[Zi] = random.choice(bn.variable_values(Zi))
-    for j in range(N):
-        for Zi in Z:
-            state[Zi] = markov_blanket_sample(Zi, state, bn)
-            counts[state[X]] += 1
-    return ProbDist(X, counts)
+        state[column[Zi]] = int(random.choice(bn.variable_values(Zi)))
+
+    counts = _gibbs_loop(
+        N,
+        state,
+        np.array([column[Zi] for Zi in Z], dtype=np.int64),
+        column[X],
+        frozen.parents_indptr,
+        frozen.parents,
+        frozen.children_indptr,
+        frozen.children,
+        frozen.p_true_offset,
+        frozen.p_true,
+        random.getrandbits(31),
+    )  # bold N in [Figure 14.16]
+    return ProbDist.from_array(X, [False, True], counts)
+
+
+def _csr(lists):
+    """Flatten a list of int lists into (indptr, flat) CSR-style arrays."""
+    indptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(l) for l in lists])
+    flat = np.array([x for l in lists for x in l], dtype=np.int64)
+    return indptr, flat
+
+
+@njit(cache=True)
+def _node_p_packed(
+    j, state, parents_indptr, parents, cpt_offset, cpt_p_true
+):
+    """P(X_j = state[j] | parents), read from the packed CPT tables."""
+    index = 0
+    for k in range(parents_indptr[j], parents_indptr[j + 1]):
+        index |= state[parents[k]] << (k - parents_indptr[j])
+    p_true = cpt_p_true[cpt_offset[j] + index]
+    return p_true if state[j] else 1.0 - p_true
+
+
+@njit(cache=True)
+def _gibbs_loop(
+    N,
+    state,
+    z_columns,
+    x_column,
+    parents_indptr,
+    parents,
+    children_indptr,
+    children,
+    cpt_offset,
+    cpt_p_true,
+    seed,
+):
+    """Run N Gibbs sweeps over z_columns, counting the query column."""
+    np.random.seed(seed)
+    counts = np.zeros(2)
+    weights = np.empty(2)
+    for _ in range(N):
+        for zi in z_columns:
+            for val in range(2):
+                state[zi] = val
+                w = _node_p_packed(
+                    zi, state, parents_indptr, parents, cpt_offset, cpt_p_true
+                )
+                for k in range(children_indptr[zi], children_indptr[zi + 1]):
+                    w *= _node_p_packed(
+                        children[k],
+                        state,
+                        parents_indptr,
+                        parents,
+                        cpt_offset,
+                        cpt_p_true,
+                    )
+                weights[val] = w
+            p_true = weights[1] / (weights[0] + weights[1])
+            state[zi] = 1 if np.random.random() < p_true else 0
+            counts[state[x_column]] += 1.0
+    return counts
 
 
 def markov_blanket_sample(X, e, bn):
@@ -568,15 +1047,16 @@ def markov_blanket_sample(X, e, bn):
     e (which must assign a value to each). The Markov blanket of X is
     X's parents, children, and children's parents."""
     Xnode = bn.variable_node(X)
-    Q = ProbDist(X)
-    for xi in bn.variable_values(X):
-        ei = {**e, X: xi}
+    domain = bn.variable_values(X)
+    q = np.empty(len(domain))
+    for i, xi in enumerate(domain):
+        ei = {**e, X: xi}  # e need not assign X, so don't mutate it
         # [Equation 14.12:]
-        Q[xi] = Xnode.p(xi, e) * product(
+        q[i] = Xnode.p(xi, ei) * product(
             Yj.p(ei[Yj.variable], ei) for Yj in Xnode.children
         )
     # (assuming a Boolean variable here)
-    return probability(Q.normalize()[True])
+    return probability(ProbDist.from_array(X, domain, q)[True])
 
 
 # _________________________________________________________________________
@@ -586,8 +1066,8 @@ class HiddenMarkovModel:
     """A Hidden markov model which takes Transition model and Sensor model as inputs"""
 
     def __init__(self, transition_model, sensor_model, prior=None):
-        self.transition_model = transition_model
-        self.sensor_model = sensor_model
+        self.transition_model = np.asarray(transition_model, dtype=np.float64)
+        self.sensor_model = np.asarray(sensor_model, dtype=np.float64)
         self.prior = prior or [0.5, 0.5]
 
     def sensor_dist(self, ev):
@@ -598,53 +1078,45 @@ class HiddenMarkovModel:
 
 
 def forward(HMM, fv, ev):
-    prediction = vector_add(
-        scalar_vector_product(fv[0], HMM.transition_model[0]),
-        scalar_vector_product(fv[1], HMM.transition_model[1]),
-    )
-    sensor_dist = HMM.sensor_dist(ev)
+    prediction = np.asarray(fv) @ HMM.transition_model
+    posterior = HMM.sensor_dist(ev) * prediction
 
-    return normalize(element_wise_product(sensor_dist, prediction))
+    return posterior / posterior.sum()
 
 
 def backward(HMM, b, ev):
-    sensor_dist = HMM.sensor_dist(ev)
-    prediction = element_wise_product(sensor_dist, b)
+    prediction = HMM.sensor_dist(ev) * np.asarray(b)
+    message = prediction @ HMM.transition_model
 
-    return normalize(
-        vector_add(
-            scalar_vector_product(prediction[0], HMM.transition_model[0]),
-            scalar_vector_product(prediction[1], HMM.transition_model[1]),
-        )
-    )
+    return message / message.sum()
 
 
 def forward_backward(HMM, ev, prior):
     """[Figure 15.4]
     Forward-Backward algorithm for smoothing. Computes posterior probabilities
-    of a sequence of states given a sequence of observations."""
+    of a sequence of states given a sequence of observations.
+    Messages are kept in ndarrays so every step is a matmul/broadcast."""
     t = len(ev)
     ev.insert(0, None)  # to make the code look similar to pseudo code
 
-    fv = [[0.0, 0.0] for _ in range(len(ev))]
-    b = [1.0, 1.0]
+    fv = np.zeros((len(ev), 2))
+    b = np.ones(2)
     bv = [
         b
     ]  # we don't need bv; but we will have a list of all backward messages here
-    sv = [[0, 0] for _ in range(len(ev))]
+    sv = np.zeros((len(ev), 2))
 
     fv[0] = prior
 
     for i in range(1, t + 1):
         fv[i] = forward(HMM, fv[i - 1], ev[i])
     for i in range(t, -1, -1):
-        sv[i - 1] = normalize(element_wise_product(fv[i], b))
+        smoothed = fv[i] * b
+        sv[i - 1] = smoothed / smoothed.sum()
         b = backward(HMM, b, ev[i])
         bv.append(b)
 
-    sv = sv[::-1]
-
-    return sv
+    return sv[::-1].tolist()
 
 
 # _________________________________________________________________________
@@ -686,42 +1158,21 @@ def fixed_lag_smoothing(e_t, HMM, d, ev, t):
 
 def particle_filtering(e, N, HMM):
     """Particle filtering considering two states variables."""
-    dist = [0.5, 0.5]
-    # Weight Initialization
-    w = [0 for _ in range(N)]
+    dist = np.array([0.5, 0.5])
     # STEP 1
     # Propagate one step using transition model given prior state
-    dist = vector_add(
-        scalar_vector_product(dist[0], HMM.transition_model[0]),
-        scalar_vector_product(dist[1], HMM.transition_model[1]),
-    )
-    # Assign state according to probability
-    s = ["A" if probability(dist[0]) else "B" for _ in range(N)]
-    w_tot = 0
-    # Calculate importance weight given evidence e
-    for i in range(N):
-        if s[i] == "A":
-            # P(U|A)*P(A)
-            w_i = HMM.sensor_dist(e)[0] * dist[0]
-        if s[i] == "B":
-            # P(U|B)*P(B)
-            w_i = HMM.sensor_dist(e)[1] * dist[1]
-        w[i] = w_i
-        w_tot += w_i
-
+    dist = dist @ HMM.transition_model
+    # Assign states according to probability (index 0 is "A", 1 is "B")
+    s = (np.random.random(N) >= dist[0]).astype(np.intp)
+    # Calculate importance weights given evidence e: P(U|state)*P(state)
+    w = HMM.sensor_dist(e)[s] * dist[s]
     # Normalize all the weights
-    for i in range(N):
-        w[i] = w[i] / w_tot
-
-    # Limit weights to 4 digits
-    for i in range(N):
-        w[i] = float("{0:.4f}".format(w[i]))
+    w = w / w.sum()
 
     # STEP 2
+    s = np.random.choice(s, size=N, replace=True, p=w)
 
-    s = weighted_sample_with_replacement(N, s, w)
-
-    return s
+    return ["A" if state == 0 else "B" for state in s]
 
 
 # _________________________________________________________________________
@@ -734,23 +1185,23 @@ class MCLmap:
 
     def __init__(self, m):
         self.m = m
+        self.grid = np.asarray(m, dtype=np.uint8)
         self.nrows = len(m)
         self.ncols = len(m[0])
-        # list of empty spaces in the map
-        self.empty = [
-            (i, j)
-            for i in range(self.nrows)
-            for j in range(self.ncols)
-            if not m[i][j]
-        ]
+        # (K, 2) array of the empty (row, col) cells in the map
+        self.empty = np.argwhere(self.grid == 0).astype(np.int32)
 
     def sample(self):
         """Returns a random kinematic state possible in the map"""
-        pos = random.choice(self.empty)
+        return tuple(self.sample_batch(1)[0])
+
+    def sample_batch(self, N):
+        """Returns N random kinematic states as an (N, 3) int array
+        of (row, col, orientation) drawn in one vectorized pass."""
+        pos = self.empty[np.random.randint(len(self.empty), size=N)]
         # 0N 1E 2S 3W
-        orient = random.choice(range(4))
-        kin_state = pos + (orient,)
-        return kin_state
+        orient = np.random.randint(4, size=N, dtype=np.int32)
+        return np.concatenate([pos, orient[:, None]], axis=1)
 
     def ray_cast(self, sensor_num, kin_state):
         """Returns distace to nearest obstacle or map boundary in the direction of sensor"""
@@ -767,15 +1218,30 @@ class MCLmap:
         # sensor direction changes based on orientation
         for _ in range(orient):
             delta = (delta[1], -delta[0])
-        range_count = 0
-        while (
-            (0 <= pos[0] < self.nrows)
-            and (0 <= pos[1] < self.nrows)
-            and (not self.m[pos[0]][pos[1]])
-        ):
-            pos = vector_add(pos, delta)
-            range_count += 1
-        return range_count
+        return _ray_cast(
+            self.grid, pos[0], pos[1], delta[0], delta[1], self.nrows,
+            self.ncols,
+        )
+
+
+@njit(cache=True)
+def _ray_cast(grid, row, col, drow, dcol, bound, ncols):
+    """Step from (row, col) along (drow, dcol) until an obstacle or the
+    map bound; return the number of steps taken. Both coordinates are
+    compared against bound (nrows) for parity with the original code,
+    but the column is also clamped to the true width: the compiled loop
+    skips bounds checks, so grid[row, col] must never go out of range."""
+    range_count = 0
+    while (
+        0 <= row < bound
+        and 0 <= col < bound
+        and col < ncols
+        and grid[row, col] == 0
+    ):
+        row += drow
+        col += dcol
+        range_count += 1
+    return range_count
 
 
 def monte_carlo_localization(a, z, N, P_motion_sample, P_sensor, m, S=None):
@@ -792,7 +1258,7 @@ def monte_carlo_localization(a, z, N, P_motion_sample, P_sensor, m, S=None):
     w = a["w"]
 
     if S is None:
-        S = [m.sample() for _ in range(N)]
+        S = [tuple(kin_state) for kin_state in m.sample_batch(N)]
 
     for i in range(N):
         S_[i] = P_motion_sample(S[i], v, w)
@@ -1,6 +1,10 @@
 import random
+
+import numpy as np
+import pytest
+
 from ..probability import *
-from ..utils import rounder
+from ..utils import rounder, vector_add
 
 
 def tests():
@@ -17,11 +21,11 @@ def tests():
     assert not consistent_with(s, {'A': False})
     assert not consistent_with(s, {'D': True})
 
-    random.seed(21)
+    np.random.seed(21)
     p = rejection_sampling('Earthquake', {}, burglary, 1000)
     assert p[True], p[False] == (0.001, 0.999)
 
-    random.seed(71)
+    np.random.seed(71)
     p = likelihood_weighting('Earthquake', {}, burglary, 1000)
     assert p[True], p[False] == (0.002, 0.998)
 
@@ -41,6 +45,15 @@ def test_probdist_basic():
     assert P['6'] == 0.4
 
 
+def test_probdist_from_array():
+    P = ProbDist.from_array('X', ['lo', 'med', 'hi'], [125, 375, 500])
+    assert (P['lo'], P['med'], P['hi']) == (0.125, 0.375, 0.5)
+    assert P['other'] == 0
+
+    with pytest.raises(ZeroDivisionError):
+        ProbDist.from_array('X', [False, True], [0, 0])
+
+
 def test_probdist_frequency():
     P = ProbDist('X', {'lo': 125, 'med': 375, 'hi': 500})
     assert (P['lo'], P['med'], P['hi']) == (0.125, 0.375, 0.5)
@@ -142,6 +155,52 @@ def test_enumeration_ask():
             burglary).show_approx() == 'False: 0.944, True: 0.0561'
 
 
+def test_relevant_variables():
+    assert burglary.relevant_variables('JohnCalls', {}) == [
+            'Burglary', 'Earthquake', 'Alarm', 'JohnCalls']
+    assert burglary.relevant_variables('Burglary', dict(MaryCalls=T)) == [
+            'Burglary', 'Earthquake', 'Alarm', 'MaryCalls']
+    # barren descendants of the query are pruned entirely
+    assert burglary.relevant_variables('Burglary', {}) == ['Burglary']
+
+
+def test_min_fill_order():
+    # Alarm links all four other variables in the moralized graph, so
+    # min-fill defers it behind the zero-fill leaves; alphabetical
+    # tie-breaking alone would eliminate it first.
+    assert burglary.min_fill_order(burglary.variables) == [
+            'Burglary', 'Earthquake', 'JohnCalls', 'Alarm', 'MaryCalls']
+
+
+def test_freeze():
+    frozen = burglary.freeze()
+    assert frozen is burglary.freeze()  # cached per network
+    j = frozen.column['Alarm']
+    parents = frozen.parents[
+            frozen.parents_indptr[j]:frozen.parents_indptr[j + 1]]
+    assert list(parents) == [
+            frozen.column['Burglary'], frozen.column['Earthquake']]
+    children = frozen.children[
+            frozen.children_indptr[j]:frozen.children_indptr[j + 1]]
+    assert sorted(children) == sorted(
+            [frozen.column['JohnCalls'], frozen.column['MaryCalls']])
+    # P(Alarm=True | Burglary=T, Earthquake=T): bit 0 packs Burglary
+    assert frozen.p_true[frozen.p_true_offset[j] + 0b11] == \
+        pytest.approx(0.95)
+
+
+def test_compile_enumeration():
+    ask = burglary.compile_enumeration()
+    assert ask is burglary.compile_enumeration()  # cached per network
+    assert ask(
+            'Burglary', dict(JohnCalls=T, MaryCalls=T)
+            ).show_approx() == 'False: 0.716, True: 0.284'
+    for X, e in [('Burglary', dict(JohnCalls=T)),
+                 ('Earthquake', dict(MaryCalls=T))]:
+        assert ask(X, e).show_approx() == \
+            enumeration_ask(X, e, burglary).show_approx()
+
+
 def test_elemination_ask():
     assert elimination_ask(
             'Burglary', dict(JohnCalls=T, MaryCalls=T),
@@ -187,82 +246,82 @@ def test_prior_sample2():
 
 
 def test_rejection_sampling():
-    random.seed(47)
+    np.random.seed(47)
     assert rejection_sampling(
             'Burglary', dict(JohnCalls=T, MaryCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.7, True: 0.3'
+            burglary, 10000).show_approx() == 'False: 0.75, True: 0.25'
     assert rejection_sampling(
             'Burglary', dict(JohnCalls=T, MaryCalls=F),
-            burglary, 10000).show_approx() == 'False: 1, True: 0'
+            burglary, 10000).show_approx() == 'False: 0.996, True: 0.00407'
     assert rejection_sampling(
             'Burglary', dict(JohnCalls=F, MaryCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.987, True: 0.0128'
+            burglary, 10000).show_approx() == 'False: 1, True: 0'
     assert rejection_sampling(
             'Burglary', dict(JohnCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.982, True: 0.0183'
+            burglary, 10000).show_approx() == 'False: 0.992, True: 0.008'
     assert rejection_sampling(
             'Burglary', dict(MaryCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.965, True: 0.0348'
+            burglary, 10000).show_approx() == 'False: 0.923, True: 0.0769'
 
 
 def test_rejection_sampling2():
-    random.seed(42)
+    np.random.seed(42)
     assert rejection_sampling(
             'Cloudy', dict(Rain=T, Sprinkler=T),
-            sprinkler, 10000).show_approx() == 'False: 0.56, True: 0.44'
+            sprinkler, 10000).show_approx() == 'False: 0.544, True: 0.456'
     assert rejection_sampling(
             'Cloudy', dict(Rain=T, Sprinkler=F),
-            sprinkler, 10000).show_approx() == 'False: 0.119, True: 0.881'
+            sprinkler, 10000).show_approx() == 'False: 0.121, True: 0.879'
     assert rejection_sampling(
             'Cloudy', dict(Rain=F, Sprinkler=T),
-            sprinkler, 10000).show_approx() == 'False: 0.951, True: 0.049'
+            sprinkler, 10000).show_approx() == 'False: 0.949, True: 0.0509'
     assert rejection_sampling(
             'Cloudy', dict(Rain=T),
-            sprinkler, 10000).show_approx() == 'False: 0.205, True: 0.795'
+            sprinkler, 10000).show_approx() == 'False: 0.187, True: 0.813'
     assert rejection_sampling(
             'Cloudy', dict(Sprinkler=T),
-            sprinkler, 10000).show_approx() == 'False: 0.835, True: 0.165'
+            sprinkler, 10000).show_approx() == 'False: 0.828, True: 0.172'
 
 
 def test_likelihood_weighting():
-    random.seed(1017)
+    np.random.seed(1017)
     assert likelihood_weighting(
             'Burglary', dict(JohnCalls=T, MaryCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.702, True: 0.298'
+            burglary, 10000).show_approx() == 'False: 0.749, True: 0.251'
     assert likelihood_weighting(
             'Burglary', dict(JohnCalls=T, MaryCalls=F),
-            burglary, 10000).show_approx() == 'False: 0.993, True: 0.00656'
+            burglary, 10000).show_approx() == 'False: 0.997, True: 0.0028'
     assert likelihood_weighting(
             'Burglary', dict(JohnCalls=F, MaryCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.996, True: 0.00363'
+            burglary, 10000).show_approx() == 'False: 0.993, True: 0.00737'
     assert likelihood_weighting(
             'Burglary', dict(JohnCalls=F, MaryCalls=F),
-            burglary, 10000).show_approx() == 'False: 1, True: 0.000126'
+            burglary, 10000).show_approx() == 'False: 1, True: 3.84e-05'
     assert likelihood_weighting(
             'Burglary', dict(JohnCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.979, True: 0.0205'
+            burglary, 10000).show_approx() == 'False: 0.984, True: 0.0156'
     assert likelihood_weighting(
             'Burglary', dict(MaryCalls=T),
-            burglary, 10000).show_approx() == 'False: 0.94, True: 0.0601'
+            burglary, 10000).show_approx() == 'False: 0.982, True: 0.0184'
 
 
 def test_likelihood_weighting2():
-    random.seed(42)
+    np.random.seed(42)
     assert likelihood_weighting(
             'Cloudy', dict(Rain=T, Sprinkler=T),
-            sprinkler, 10000).show_approx() == 'False: 0.559, True: 0.441'
+            sprinkler, 10000).show_approx() == 'False: 0.548, True: 0.452'
     assert likelihood_weighting(
             'Cloudy', dict(Rain=T, Sprinkler=F),
-            sprinkler, 10000).show_approx() == 'False: 0.12, True: 0.88'
+            sprinkler, 10000).show_approx() == 'False: 0.123, True: 0.877'
     assert likelihood_weighting(
             'Cloudy', dict(Rain=F, Sprinkler=T),
-            sprinkler, 10000).show_approx() == 'False: 0.951, True: 0.0486'
+            sprinkler, 10000).show_approx() == 'False: 0.951, True: 0.0488'
     assert likelihood_weighting(
             'Cloudy', dict(Rain=T),
-            sprinkler, 10000).show_approx() == 'False: 0.198, True: 0.802'
+            sprinkler, 10000).show_approx() == 'False: 0.202, True: 0.798'
     assert likelihood_weighting(
             'Cloudy', dict(Sprinkler=T),
-            sprinkler, 10000).show_approx() == 'False: 0.833, True: 0.167'
+            sprinkler, 10000).show_approx() == 'False: 0.832, True: 0.168'
 
 
 def test_forward_backward():
@@ -320,6 +379,7 @@ def test_particle_filtering():
 def test_monte_carlo_localization():
     ## TODO: Add tests for random motion/inaccurate sensors
     random.seed('aima-python')
+    np.random.seed(42)  # particle init and orientations use np.random
     m = MCLmap([[0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 1, 0],
                 [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 0, 1, 1, 0],
                 [1, 1, 1, 1, 1, 1, 1, 1, 0, 0, 1, 1, 1, 0, 1, 1, 0],
@@ -380,10 +440,9 @@ def test_monte_carlo_localization():
 
 
 def test_gibbs_ask():
-    possible_solutions = ['False: 0.16, True: 0.84', 'False: 0.17, True: 0.83',
-                          'False: 0.15, True: 0.85', 'False: 0.165, True: 0.835']
+    random.seed(42)
     g_solution = gibbs_ask('Cloudy', dict(Rain=True), sprinkler, 200).show_approx()
-    assert g_solution in possible_solutions
+    assert g_solution == 'False: 0.21, True: 0.79'
 
 
 # The following should probably go in .ipynb:
@@ -41,15 +41,17 @@ class MaxoutFactor:
             max_p = -1
             max_value = None
             for val in bn.variable_values(var):
-                val_p = self.p({**e, var: val})
+                e[var] = val  # e is a fresh dict, safe to extend in place
+                val_p = self.p(e)
                 if max_p < val_p:
                     max_value = val
                     max_p = val_p
 
+            e[var] = max_value
             cpt[cpt_key] = max_p
             mpe[cpt_key] = {
                 **self.previous_assignments[
-                    event_values({**e, var: max_value}, self.variables)
+                    event_values(e, self.variables)
                 ],
                 var: max_value,
             }